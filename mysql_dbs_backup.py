@@ -5,17 +5,32 @@
 # License: GPL v3
 #
 # Description:
-# This script performs a backup of specified MySQL databases, compresses each backup into a .zip file,
+# This script performs a backup of specified MySQL databases, compresses each backup into a .zst (or .zip) file,
 # manages the retention of a specified number of backups, logs its operations, and writes a status message.
 
+import atexit
+import ctypes
 import os
+import queue
+import re
+import shlex
+import shutil
+import socket
 import subprocess
+import hashlib
+import heapq
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import sys
+import tarfile  # For bundling mydumper output
+import tempfile
+import threading
 import mysql.connector
+from mysql.connector import pooling
 import zipfile  # For zip compression
+import zstandard as zstd  # For zstd compression
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -25,10 +40,66 @@ load_dotenv()
 base_dir = os.path.dirname(os.path.abspath(__file__))  # Directory where the script is located
 dump_path = os.path.join(base_dir, 'mysql_dbs_backups')  # Directory for dump files
 
+# Name of this machine, reported in the final status lines
+hostname = socket.gethostname()
+
 # Backup filename configuration
-# Default filename format: YYYYMMDDHHMMSS_DATABASENAME_HOSTNAME.sql.zip
+# Default filename format: YYYYMMDDHHMMSS_DATABASENAME.sql.zst
 backup_filename_format = "%Y%m%d%H%M%S"
 
+# Environment variables that define a database (DB1_NAME, DB2_NAME, ...)
+db_name_pattern = re.compile(r"^DB(\d+)_NAME$")
+
+# Compiled filename patterns used to find each database's backups, cached per database name
+backup_name_patterns = {}
+
+# Compression settings
+backup_format = os.getenv("BACKUP_FORMAT", "zst")  # 'zst' (default) or 'zip'
+zstd_level = int(os.getenv("ZSTD_LEVEL", 3))  # zstd compression level, default 3
+# zstd implementation for mysqldump backups: 'module' (zstandard, default) or 'cli' (pipe
+# mysqldump straight into the zstd command, so the dump never passes through Python)
+zstd_compressor = os.getenv("ZSTD_COMPRESSOR", "module")
+
+# Dump tool: 'mysqldump' (default) or 'mydumper' for parallel, chunked dumps
+backup_tool = os.getenv("BACKUP_TOOL", "mysqldump")
+mydumper_rows = os.getenv("MYDUMPER_ROWS", "50000")  # Rows per chunk file
+mydumper_threads = os.getenv("MYDUMPER_THREADS", "8")  # Dump threads per database
+
+# Default mysqldump options: consistent InnoDB snapshot without table locks (--single-transaction),
+# row-by-row streaming (--quick), client/server protocol compression (--compress)
+# Can be overridden per database with DBx_MYSQLDUMP_ARGS
+default_mysqldump_args = "--single-transaction --quick --compress --hex-blob --routines --triggers --events"
+
+# Number of databases backed up in parallel
+backup_concurrency = max(1, int(os.getenv("BACKUP_CONCURRENCY", 4)))
+
+# Absolute paths of the external commands, resolved once at startup by check_command
+command_paths = {}
+
+# Connection pools shared by all databases on the same server, keyed by (host, user, password)
+connection_pools = {}
+connection_pool_sizes = {}
+connection_pools_lock = threading.Lock()
+
+# Suffix of backup files that are still being written
+PARTIAL_SUFFIX = '.partial'
+
+# Suffix of the files storing the database signature next to each backup (see DBx_SKIP_UNCHANGED)
+SIGNATURE_SUFFIX = '.sig'
+
+# Preallocate disk space for backup files (opt-in, Linux only)
+preallocate_backups = os.getenv("PREALLOCATE_BACKUPS", "false").lower() in ("1", "true", "yes")
+
+# Expected compressed backup size relative to the database's data length, used to preallocate backup files
+BACKUP_SIZE_RATIO = 0.3
+
+# The raw fallocate() call, resolved by load_native_fallocate() if preallocation is enabled.
+# None if unavailable.
+native_fallocate = None
+
+# Size of the chunks streamed from mysqldump into the backup archive (1 MiB)
+STREAM_CHUNK_SIZE = 1024 * 1024
+
 # Set up logging
 log_filename = os.path.join(base_dir, 'mysql_dbs_backup.log')  # Updated log file name
 logger = logging.getLogger('mysql_dbs_backup.py')  # Updated logger name
@@ -36,7 +107,7 @@ logger.setLevel(logging.DEBUG)
 handler = RotatingFileHandler(log_filename, maxBytes=5 * 1024 * 1024, backupCount=5)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
-logger.addHandler(handler)
+log_handlers = [handler]
 
 # Check for verbose flag
 verbose = '-v' in sys.argv
@@ -45,7 +116,15 @@ if verbose:
     # Add console handler if verbose mode is enabled
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    log_handlers.append(console_handler)
+
+# Backup threads only enqueue log records; a single listener thread does the file/console I/O,
+# so parallel backups don't contend on the handlers' locks
+log_queue = queue.Queue(-1)
+logger.addHandler(QueueHandler(log_queue))
+log_listener = QueueListener(log_queue, *log_handlers)
+log_listener.start()
+atexit.register(log_listener.stop)  # Flush remaining records on exit
 
 def setup_directories():
     """
@@ -59,106 +138,538 @@ def setup_directories():
         logger.error(f"Error setting up directories: {e}")
         sys.exit(1)
 
-def error_exit(message, backup_file=None):
+def error_exit(message, backup_file=None, dbname=None):
     """
     Logs the error message, writes a final status to the log, and exits the script.
     """
     logger.error(message)
-    write_final_status("failure", message, backup_file)
+    write_final_status("failure", message, backup_file, dbname)
     sys.exit(1)
 
-def check_mysqldump():
+def validate_settings():
     """
-    Checks if mysqldump is available in the system's PATH.
+    Checks that the global settings from the environment have supported values.
     """
+    if backup_format not in ("zst", "zip"):
+        error_exit(f"Invalid BACKUP_FORMAT '{backup_format}'. Supported values: zst, zip.")
+    if backup_tool not in ("mysqldump", "mydumper"):
+        error_exit(f"Invalid BACKUP_TOOL '{backup_tool}'. Supported values: mysqldump, mydumper.")
+    if zstd_compressor not in ("module", "cli"):
+        error_exit(f"Invalid ZSTD_COMPRESSOR '{zstd_compressor}'. Supported values: module, cli.")
+
+def check_command(name, hint):
+    """
+    Checks if the command is available in the system's PATH and caches its absolute path.
+    """
+    command_path = shutil.which(name)
+    if not command_path:
+        error_exit(f"{name} command not found. {hint}")
     try:
-        result = subprocess.run(['mysqldump', '--version'], capture_output=True, text=True, check=True)
-        logger.info(f"mysqldump available: {result.stdout.strip()}")
-    except subprocess.CalledProcessError as e:
-        error_exit("mysqldump command is not available or failed to execute. Please ensure MySQL is installed and mysqldump is in your PATH.")
-    except FileNotFoundError:
-        error_exit("mysqldump command not found. Please ensure MySQL is installed and mysqldump is in your PATH.")
+        result = subprocess.run([command_path, '--version'], capture_output=True, text=True, check=True)
+        logger.info(f"{name} available: {result.stdout.strip()}")
+    except subprocess.CalledProcessError:
+        error_exit(f"{name} command is not available or failed to execute. {hint}")
+    command_paths[name] = command_path
 
-def check_database_connection(dbname, dbuser, dbpass, dbhost):
+def size_connection_pools(db_configs):
+    """
+    Sizes each connection pool to the number of databases sharing its server and account,
+    capped by BACKUP_CONCURRENCY. MySQLConnectionPool opens all of its connections up front,
+    so a database with its own account gets a single connection.
+    """
+    database_counts = {}
+    for db_config in db_configs:
+        key = (db_config["host"], db_config["user"], db_config["pass"])
+        database_counts[key] = database_counts.get(key, 0) + 1
+    for key, count in database_counts.items():
+        connection_pool_sizes[key] = min(count, backup_concurrency, pooling.CNX_POOL_MAXSIZE)
+
+def get_connection(dbuser, dbpass, dbhost):
+    """
+    Returns a server connection from a pool shared by all databases on the same server and
+    account, so the TCP/TLS/auth handshake is not repeated for every database.
+    Closing the connection returns it to the pool.
+    """
+    key = (dbhost, dbuser, dbpass)
+    with connection_pools_lock:
+        pool = connection_pools.get(key)
+        if pool is None:
+            pool = pooling.MySQLConnectionPool(
+                pool_name=f"mysql_dbs_backup_{len(connection_pools)}",
+                pool_size=connection_pool_sizes.get(key, 1),
+                host=dbhost,
+                user=dbuser,
+                password=dbpass
+            )
+            connection_pools[key] = pool
+    return pool.get_connection()
+
+def describe_connection_error(err):
+    """
+    Returns a hint for common MySQL connection error codes.
     """
-    Checks if the database connection can be established with the provided credentials.
-    Logs errors if there are connection or permission issues.
+    if err.errno == 1045:
+        return " (Check your username and password)"
+    elif err.errno == 1049:
+        return " (Database does not exist)"
+    elif err.errno == 2003:
+        return " (Cannot connect to the database server)"
+    return ""
+
+def check_database_connections(db_configs):
+    """
+    Checks that all configured databases exist and are accessible with the provided credentials.
+    Databases sharing the same host and credentials are verified with a single
+    INFORMATION_SCHEMA query instead of one connection per database.
+    Logs errors if there are connection or permission issues and returns a dict mapping
+    each failed database name to its error message.
+    """
+    failures = {}
+    groups = {}
+    for db_config in db_configs:
+        groups.setdefault((db_config["host"], db_config["user"], db_config["pass"]), []).append(db_config["name"])
+
+    for (dbhost, dbuser, dbpass), dbnames in groups.items():
+        try:
+            connection = get_connection(dbuser, dbpass, dbhost)
+            try:
+                cursor = connection.cursor()
+                placeholders = ", ".join(["%s"] * len(dbnames))
+                # Compare case-insensitively, since servers with lower_case_table_names
+                # report schema names in lower case
+                cursor.execute(
+                    f"SELECT SCHEMA_NAME FROM information_schema.SCHEMATA WHERE LOWER(SCHEMA_NAME) IN ({placeholders})",
+                    [dbname.lower() for dbname in dbnames]
+                )
+                found = {row[0].lower() for row in cursor.fetchall()}
+                cursor.close()
+            finally:
+                connection.close()
+        except mysql.connector.Error as err:
+            for dbname in dbnames:
+                error_msg = f"Database connection failed for '{dbname}': {err}{describe_connection_error(err)}"
+                failures[dbname] = error_msg
+                logger.error(error_msg)
+            continue
+
+        for dbname in dbnames:
+            if dbname.lower() in found:
+                logger.info(f"Successfully connected to the database '{dbname}' on host '{dbhost}'.")
+            else:
+                error_msg = f"Database connection failed for '{dbname}' on host '{dbhost}' (Database does not exist or access denied)"
+                failures[dbname] = error_msg
+                logger.error(error_msg)
+
+    return failures
+
+def parse_zip_level(value):
+    """
+    Returns the zip compression level as an int, or None if it is not a number between 0 and 9.
     """
     try:
-        connection = mysql.connector.connect(
-            host=dbhost,
-            user=dbuser,
-            password=dbpass,
-            database=dbname
-        )
-        connection.close()
-        logger.info(f"Successfully connected to the database '{dbname}' on host '{dbhost}'.")
+        zip_level = int(value)
+    except ValueError:
+        return None
+    return zip_level if 0 <= zip_level <= 9 else None
+
+def get_database_signature(dbname, dbuser, dbpass, dbhost):
+    """
+    Returns a signature of the database's table metadata (row counts, data and index sizes,
+    last update times, column and index definitions) from INFORMATION_SCHEMA, used to detect
+    databases that have not changed since the last backup.
+    Returns None if the signature is unavailable or unreliable (e.g. tables without UPDATE_TIME).
+    """
+    try:
+        connection = get_connection(dbuser, dbpass, dbhost)
+        try:
+            cursor = connection.cursor()
+            try:
+                # MySQL 8.0+ caches table statistics (default: 24 hours), which would hide recent changes
+                cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+            except mysql.connector.Error:
+                pass  # Servers before MySQL 8.0 don't cache the statistics
+            cursor.execute(
+                "SELECT COUNT(*), COUNT(UPDATE_TIME), MAX(UPDATE_TIME), SUM(TABLE_ROWS), SUM(DATA_LENGTH), "
+                "SUM(INDEX_LENGTH), NOW() FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s",
+                (dbname,)
+            )
+            table_count, updated_count, last_update, total_rows, total_length, index_length, now = cursor.fetchone()
+
+            # DDL such as ALTER TABLE does not always change the table statistics,
+            # so fingerprint the column and index definitions as well
+            schema_hash = hashlib.sha256()
+            cursor.execute(
+                "SELECT TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, EXTRA "
+                "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, ORDINAL_POSITION",
+                (dbname,)
+            )
+            for row in cursor.fetchall():
+                schema_hash.update(("|".join(map(str, row)) + "\n").encode())
+            cursor.execute(
+                "SELECT TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, NON_UNIQUE "
+                "FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX",
+                (dbname,)
+            )
+            for row in cursor.fetchall():
+                schema_hash.update(("|".join(map(str, row)) + "\n").encode())
+            cursor.close()
+        finally:
+            connection.close()
     except mysql.connector.Error as err:
-        error_msg = f"Database connection failed for '{dbname}': {err}"
-        if err.errno == 1045:
-            error_msg += " (Check your username and password)"
-        elif err.errno == 1049:
-            error_msg += " (Database does not exist)"
-        elif err.errno == 2003:
-            error_msg += " (Cannot connect to the database server)"
-        write_final_status("failure", error_msg)  # Log failure for each database
-        logger.error(error_msg)
+        logger.warning(f"Could not read the signature of database '{dbname}': {err}")
+        return None
+    if table_count != updated_count:
+        # Without an UPDATE_TIME for every table, changes cannot be detected reliably
+        return None
+    if last_update is not None and (now - last_update).total_seconds() < 2:
+        # UPDATE_TIME only has one-second resolution, so a write later in the same second
+        # would not change the signature
+        return None
+    return f"{table_count}|{last_update}|{total_rows}|{total_length}|{index_length}|{schema_hash.hexdigest()}"
+
+def reuse_unchanged_backup(dbname, backup_file, signature):
+    """
+    Hardlinks the latest backup of the same type to backup_file if it was taken with the same
+    database signature. Returns True if the previous backup was reused.
+    """
+    extension = os.path.basename(backup_file).split(f"_{dbname}", 1)[1]  # e.g. .sql.zst
+    previous_backups = [backup for backup in list_backups(dbname) if backup[1].endswith(extension)]
+    if not previous_backups:
+        return False
+    _, previous_file = max(previous_backups)
+    try:
+        with open(previous_file + SIGNATURE_SUFFIX) as signature_file:
+            if signature_file.read() != signature:
+                return False
+    except FileNotFoundError:
+        return False
+    try:
+        os.link(previous_file, backup_file)
+    except OSError as e:
+        logger.warning(f"Could not hardlink {previous_file} to {backup_file}: {e}")
+        return False
+    return True
+
+def write_backup_signature(backup_file, signature):
+    """
+    Stores the database signature next to the backup file.
+    """
+    try:
+        with open(backup_file + SIGNATURE_SUFFIX, 'w') as signature_file:
+            signature_file.write(signature)
+    except OSError as e:
+        logger.warning(f"Could not write signature file for {backup_file}: {e}")
 
 def generate_backup_filename(dbname):
     """
     Generates the filename for the backup based on the default format or user setting.
     """
     current_time = datetime.now().strftime(backup_filename_format)
-    backup_filename = f"{current_time}_{dbname}.sql.zip"  # Changed to .zip extension
+    extension = "tar.zst" if backup_tool == "mydumper" else f"sql.{backup_format}"
+    backup_filename = f"{current_time}_{dbname}.{extension}"
     return os.path.join(dump_path, backup_filename), current_time
 
-def perform_backup(dbname, dbuser, dbpass, dbhost, backup_file):
+def estimate_backup_size(dbname, dbuser, dbpass, dbhost):
     """
-    Performs the MySQL database backup and compresses the output into a .zip file.
+    Estimates the size of the compressed backup from the database's data length in
+    INFORMATION_SCHEMA. Returns None if the estimate is unavailable; the estimate is
+    best-effort, so no error here may fail the backup.
     """
-    logger.info(f"Starting backup for database '{dbname}'...")
     try:
-        # Create a temporary SQL dump file
-        temp_sql_file = backup_file.replace('.zip', '.sql')  # Create a .sql file first
-
-        # Run the mysqldump command to generate the SQL dump
-        command = ['mysqldump', '-h', dbhost, '-u', dbuser, f'-p{dbpass}', dbname]
-        with open(temp_sql_file, 'wb') as sql_dump:
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            sql_dump.write(result.stdout)
+        connection = get_connection(dbuser, dbpass, dbhost)
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT SUM(DATA_LENGTH) FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s", (dbname,))
+            (data_length,) = cursor.fetchone()
+            cursor.close()
+        finally:
+            connection.close()
+        # SUM() is returned as a DECIMAL, so convert before scaling
+        return int(int(data_length) * BACKUP_SIZE_RATIO) if data_length else None
+    except Exception as e:
+        logger.warning(f"Could not estimate the backup size of database '{dbname}': {e}")
+        return None
 
-        # Compress the SQL dump into a .zip file
-        with zipfile.ZipFile(backup_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(temp_sql_file, os.path.basename(temp_sql_file))
+def load_native_fallocate():
+    """
+    Resolves the raw fallocate() call from libc into native_fallocate. Unlike posix_fallocate(),
+    it fails on filesystems without native support instead of emulating it by writing every block.
+    fallocate64 is preferred since it takes 64-bit offsets on every platform; plain fallocate
+    only does so on 64-bit systems.
+    """
+    global native_fallocate
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        libc = None
+    function = getattr(libc, 'fallocate64', None)
+    if function is None and ctypes.sizeof(ctypes.c_void_p) == 8:
+        function = getattr(libc, 'fallocate', None)
+    if function is None:
+        logger.warning("fallocate is not available on this system. Backup files will not be preallocated.")
+        return
+    function.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+    function.restype = ctypes.c_int
+    native_fallocate = function
+
+def open_preallocated(path, size_estimate):
+    """
+    Opens the file for binary writing and reserves size_estimate bytes on disk up front, so the
+    filesystem can allocate the backup in large contiguous extents. Preallocation is skipped on
+    filesystems without native fallocate support. The caller should truncate the file at its
+    final position to release any unused space.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    if size_estimate and native_fallocate is not None:
+        if native_fallocate(fd, 0, 0, size_estimate) != 0:
+            error = ctypes.get_errno()
+            logger.warning(f"Could not preallocate {size_estimate} bytes for {path}: {os.strerror(error)}")
+    return os.fdopen(fd, 'wb')
+
+def write_zstd_archive(stream, out):
+    """
+    Compresses the given stream into the open .zst file using all available cores.
+    """
+    cctx = zstd.ZstdCompressor(level=zstd_level, threads=-1)
+    with cctx.stream_writer(out, closefd=False) as writer:
+        shutil.copyfileobj(stream, writer, STREAM_CHUNK_SIZE)
 
-        # Remove the temporary .sql file after zipping
-        os.remove(temp_sql_file)
+def write_zip_archive(stream, out, entry_name, zip_level):
+    """
+    Compresses the given stream into the open .zip file with a single entry named entry_name.
+    A zip_level of 0 stores the dump uncompressed; 1-9 select the DEFLATE level.
+    """
+    compression = zipfile.ZIP_STORED if zip_level == 0 else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(out, 'w', compression=compression, compresslevel=zip_level or None, allowZip64=True) as zipf:
+        with zipf.open(entry_name, 'w', force_zip64=True) as entry:
+            shutil.copyfileobj(stream, entry, STREAM_CHUNK_SIZE)
 
+def drop_from_page_cache(path):
+    """
+    Flushes the finished backup file to disk and advises the kernel to evict it from the
+    page cache, so large backups don't push the database server's hot pages out of memory.
+    Has no effect on platforms without posix_fadvise.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)  # Only clean pages can be dropped
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.warning(f"Could not drop {path} from the page cache: {e}")
+
+def create_mysql_defaults_file(dbuser, dbpass, dbhost):
+    """
+    Writes the credentials to a private (mode 0600) MySQL option file and returns its path,
+    so the password is not exposed on the command line. The caller must delete the file.
+    Raises ValueError if a value contains a line break, which neither file format can represent.
+    """
+    values = {"user": dbuser or "", "password": dbpass or "", "host": dbhost or ""}
+    for option, value in values.items():
+        if "\n" in value or "\r" in value:
+            raise ValueError(f"The MySQL {option} must not contain a line break")
+
+    def quote(value):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+    def glib_escape(value):
+        # GLib key files do not strip quotes, but treat backslashes as escapes and drop leading spaces
+        value = value.replace("\\", "\\\\")
+        return "\\s" + value[1:] if value.startswith(" ") else value
+
+    with tempfile.NamedTemporaryFile('w', prefix='mysql_dbs_backup_', suffix='.cnf', delete=False) as defaults_file:
+        os.chmod(defaults_file.name, 0o600)
+        # [client] is read by mysqldump (quoted values), [mydumper] by mydumper (GLib key file, unquoted)
+        defaults_file.write("[client]\n" + "".join(f"{option}={quote(value)}\n" for option, value in values.items()) + "\n")
+        defaults_file.write("[mydumper]\n" + "".join(f"{option}={glib_escape(value)}\n" for option, value in values.items()))
+    return defaults_file.name
+
+def run_backup(dbname, dbuser, dbpass, dbhost, backup_file, dump):
+    """
+    Writes the credentials to an option file, runs dump(defaults_file, partial_file) to write
+    the backup and handles the errors and cleanup shared by all backup tools.
+    Returns a (status, message) tuple.
+    """
+    defaults_file = None
+    # Write to a .partial file and rename it once complete, so an interrupted dump
+    # never looks like a valid backup
+    partial_file = backup_file + PARTIAL_SUFFIX
+    try:
+        defaults_file = create_mysql_defaults_file(dbuser, dbpass, dbhost)
+        dump(defaults_file, partial_file)
+        drop_from_page_cache(partial_file)
+        os.replace(partial_file, backup_file)
         logger.info(f"Backup successful: {backup_file}")
         return "success", f"Backup successful: {backup_file}"
     except subprocess.CalledProcessError as e:
         error_msg = f"Backup failed for database '{dbname}'. Error: {e.stderr.decode('utf-8')}"
         logger.error(error_msg)
-        write_final_status("failure", error_msg, backup_file)  # Log failure for each database
+        return "failure", error_msg
+    except ValueError as e:
+        error_msg = f"Backup failed for database '{dbname}'. Error: {e}"
+        logger.error(error_msg)
         return "failure", error_msg
     except PermissionError:
-        error_exit(f"Permission denied: Cannot write to {backup_file}. Check your file permissions.", backup_file)
+        error_exit(f"Permission denied: Cannot write to {backup_file}. Check your file permissions.", backup_file, dbname)
     except Exception as e:
-        error_exit(f"Unexpected error during backup process: {e}", backup_file)
+        error_exit(f"Unexpected error during backup process: {e}", backup_file, dbname)
+    finally:
+        if defaults_file:
+            os.remove(defaults_file)
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+
+def drain_stderr(process):
+    """
+    Reads the process's stderr on a background thread so a full pipe cannot stall it.
+    Returns the thread and the list that receives the output once the pipe is closed.
+    """
+    stderr_chunks = []
+    stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+    stderr_thread.start()
+    return stderr_thread, stderr_chunks
+
+def pipe_command_output(command, sink_command):
+    """
+    Runs command with its stdout connected directly to sink_command's stdin through a kernel pipe,
+    so the data never passes through Python.
+    Raises subprocess.CalledProcessError (with the captured stderr) if either command fails.
+    """
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        sink = subprocess.Popen(sink_command, stdin=process.stdout, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        # Only the sink holds the read end now, so it sees EOF (and the dump SIGPIPE) correctly
+        process.stdout.close()
+    stderr_thread, stderr_chunks = drain_stderr(process)
+    sink_stderr_thread, sink_stderr_chunks = drain_stderr(sink)
+    sink.wait()
+    if sink.returncode != 0:
+        process.kill()
+    process.wait()
+    stderr_thread.join()
+    sink_stderr_thread.join()
+    process.stderr.close()
+    sink.stderr.close()
+    # A failing sink also takes the command down, so report the sink's error first
+    if sink.returncode != 0:
+        raise subprocess.CalledProcessError(sink.returncode, sink_command, stderr=b''.join(sink_stderr_chunks))
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=b''.join(stderr_chunks))
+
+def stream_command_output(command, consume):
+    """
+    Runs the command and passes its stdout stream to consume() without buffering it in memory.
+    stderr is drained on a background thread so a full pipe cannot stall the command.
+    Raises subprocess.CalledProcessError (with the captured stderr) if the command fails.
+    """
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=STREAM_CHUNK_SIZE)
+    stderr_thread, stderr_chunks = drain_stderr(process)
+    try:
+        consume(process.stdout)
+    except BaseException:
+        # Don't leave the command running (or blocked on a full pipe) if writing the backup fails
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+        process.wait()
+        stderr_thread.join()
+        process.stderr.close()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=b''.join(stderr_chunks))
+
+def perform_backup(dbname, dbuser, dbpass, dbhost, backup_file, zip_level=1, mysqldump_args=None):
+    """
+    Performs the MySQL database backup and compresses the output into a .zst or .zip file,
+    depending on the extension of backup_file. mysqldump_args is a list of extra mysqldump options.
+    """
+    logger.info(f"Starting backup for database '{dbname}'...")
+
+    def dump(defaults_file, partial_file):
+        # Stream the mysqldump output straight into the archive, chunk by chunk
+        command = [command_paths['mysqldump'], f'--defaults-extra-file={defaults_file}', *(mysqldump_args or []), dbname]
+        if backup_file.endswith('.zst') and zstd_compressor == "cli":
+            pipe_command_output(command, [command_paths['zstd'], '-T0', f'-{zstd_level}', '-q', '-f', '-o', partial_file])
+        else:
+            size_estimate = None
+            if preallocate_backups and native_fallocate is not None:
+                size_estimate = estimate_backup_size(dbname, dbuser, dbpass, dbhost)
+            with open_preallocated(partial_file, size_estimate) as out:
+                if backup_file.endswith('.zip'):
+                    entry_name = os.path.basename(backup_file)[:-len('.zip')]  # e.g. YYYYMMDDHHMMSS_DATABASENAME.sql
+                    stream_command_output(command, lambda stream: write_zip_archive(stream, out, entry_name, zip_level))
+                else:
+                    stream_command_output(command, lambda stream: write_zstd_archive(stream, out))
+                out.truncate()  # Release the unused part of the preallocated space
+
+    return run_backup(dbname, dbuser, dbpass, dbhost, backup_file, dump)
+
+def perform_backup_mydumper(dbname, dbuser, dbpass, dbhost, backup_file):
+    """
+    Performs the MySQL database backup with mydumper (parallel, chunked per table)
+    and bundles the dump directory into a .tar.zst file.
+    """
+    logger.info(f"Starting mydumper backup for database '{dbname}'...")
+
+    def dump(defaults_file, partial_file):
+        with tempfile.TemporaryDirectory(prefix=f".{dbname}_", dir=dump_path) as output_dir:
+            command = [
+                command_paths['mydumper'], f'--defaults-file={defaults_file}',
+                '--database', dbname, '--outputdir', output_dir,
+                '--rows', mydumper_rows, '--threads', mydumper_threads,
+                '--compress', '--trx-consistency-only',
+            ]
+            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+
+            # Stream the dump directory into a zstd-compressed tar archive
+            entry_name = os.path.basename(backup_file)[:-len('.tar.zst')]  # e.g. YYYYMMDDHHMMSS_DATABASENAME
+            cctx = zstd.ZstdCompressor(level=zstd_level, threads=-1)
+            with open(partial_file, 'wb') as out, cctx.stream_writer(out) as writer:
+                with tarfile.open(fileobj=writer, mode='w|') as tar:
+                    tar.add(output_dir, arcname=entry_name)
+
+    return run_backup(dbname, dbuser, dbpass, dbhost, backup_file, dump)
+
+def list_backups(dbname):
+    """
+    Returns (mtime, path) tuples for all existing backups of the database.
+    """
+    # Match only this database's backups (TIMESTAMP_DATABASENAME.EXTENSION), so that
+    # databases sharing a name prefix (e.g. 'shop' and 'shop_test') do not rotate each other
+    # and unfinished '.partial' files are never counted as backups
+    pattern = backup_name_patterns.get(dbname)
+    if pattern is None:
+        pattern = backup_name_patterns.setdefault(
+            dbname, re.compile(rf"^\d{{14}}_{re.escape(dbname)}\.(sql\.zst|sql\.zip|tar\.zst)$")
+        )
+    # scandir caches each entry's stat result, so every file is stat'ed only once
+    with os.scandir(dump_path) as entries:
+        return [(entry.stat().st_mtime, entry.path) for entry in entries
+                if entry.is_file() and pattern.match(entry.name)]
 
 def clean_old_backups(dbname, max_backups):
     """
     Cleans up old backups in the specified directory based on the retention count.
     """
     try:
-        files = sorted(
-            [os.path.join(dump_path, f) for f in os.listdir(dump_path) if f.endswith(".zip") and dbname in f],
-            key=os.path.getmtime
-        )
-        if len(files) > max_backups:
-            for file_to_delete in files[:len(files) - max_backups]:
+        backups = list_backups(dbname)
+        excess = len(backups) - max_backups
+        if excess > 0:
+            # Only the oldest `excess` backups are needed, no full sort required
+            for _, file_to_delete in heapq.nsmallest(excess, backups):
                 try:
                     os.remove(file_to_delete)
+                    if os.path.exists(file_to_delete + SIGNATURE_SUFFIX):
+                        os.remove(file_to_delete + SIGNATURE_SUFFIX)
                     logger.info(f"Deleted old backup: {file_to_delete}")
                 except PermissionError:
                     logger.error(f"Permission denied: Cannot delete {file_to_delete}. Check file permissions.")
@@ -169,61 +680,129 @@ def clean_old_backups(dbname, max_backups):
     except Exception as e:
         logger.error(f"Error cleaning old backups: {e}")
 
-def write_final_status(status, message, backup_file=None):
+def write_final_status(status, message, backup_file=None, dbname=None):
     """
     Writes the final status of the backup to the log for external monitoring scripts.
     Format: FINAL_STATUS | STATUS | HOSTNAME | TIMESTAMP | DATABASE | FILENAME | MESSAGE
     """
     filename = os.path.basename(backup_file) if backup_file else "N/A"
-    final_status_message = f"FINAL_STATUS | {status.upper()} | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {filename} | {message}"
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    final_status_message = f"FINAL_STATUS | {status.upper()} | {hostname} | {timestamp} | {dbname or 'N/A'} | {filename} | {message}"
     logger.info(final_status_message)
 
+def backup_database(db_config):
+    """
+    Runs the complete backup cycle (backup, status, cleanup) for one database.
+    """
+    dbname = db_config["name"]
+    logger.info(f"Processing database: {dbname}")
+
+    # Don't attempt a dump that is bound to fail; report the connection error instead
+    if db_config["connection_error"]:
+        write_final_status("failure", db_config["connection_error"], dbname=dbname)
+        return
+
+    # Generate backup filename
+    backup_file, backup_time = generate_backup_filename(dbname)
+
+    # Reuse the previous backup if the database has not changed since it was taken
+    signature = None
+    if db_config["skip_unchanged"]:
+        signature = get_database_signature(dbname, db_config["user"], db_config["pass"], db_config["host"])
+    if signature and reuse_unchanged_backup(dbname, backup_file, signature):
+        status, message = "success", f"Database unchanged, previous backup hardlinked: {backup_file}"
+        logger.info(message)
+    # Perform MySQL backup
+    elif backup_tool == "mydumper":
+        status, message = perform_backup_mydumper(dbname, db_config["user"], db_config["pass"], db_config["host"],
+                                                  backup_file)
+    else:
+        status, message = perform_backup(dbname, db_config["user"], db_config["pass"], db_config["host"],
+                                         backup_file, db_config["zip_level"], db_config["mysqldump_args"])
+    if signature and status == "success":
+        write_backup_signature(backup_file, signature)
+
+    # Write final status to the log for each database
+    write_final_status(status, message, backup_file, dbname)
+
+    # Clean up old backups
+    logger.info(f"Checking for old backups to delete for database: {dbname}...")
+    clean_old_backups(dbname, db_config["max_backups"])
+
 def main():
     """
     Main function that manages the MySQL backup process for multiple databases.
     """
     logger.info("Script started")
 
+    # Check the global settings
+    validate_settings()
+
     # Set up necessary directories
     setup_directories()
 
-    # Check if mysqldump is available
-    check_mysqldump()
+    # Check if the configured dump tool is available
+    if backup_tool == "mydumper":
+        check_command('mydumper', "Please ensure mydumper is installed and in your PATH.")
+    else:
+        check_command('mysqldump', "Please ensure MySQL is installed and mysqldump is in your PATH.")
+        if backup_format == "zst" and zstd_compressor == "cli":
+            check_command('zstd', "Please ensure zstd is installed and in your PATH.")
+
+    # Look up the native fallocate() call only if preallocation is enabled
+    if preallocate_backups:
+        load_native_fallocate()
 
     # Get all database configurations from environment variables
-    db_index = 1
-    while True:
-        # Dynamically construct the environment variable names
-        dbname = os.getenv(f"DB{db_index}_NAME")
-        dbuser = os.getenv(f"DB{db_index}_USER")
-        dbpass = os.getenv(f"DB{db_index}_PASS")
-        dbhost = os.getenv(f"DB{db_index}_HOST", "localhost")  # Default to localhost if not set
-        max_backups = int(os.getenv(f"DB{db_index}_MAX_BACKUPS", 3))  # Default to 3 if not set
-
-        # Break the loop if no more databases are defined
+    # A single scan of the environment finds every DBx_NAME, so gaps in the numbering are allowed.
+    # The index is kept as written (e.g. "01" in DB01_NAME) and only sorted numerically
+    db_indices = sorted({match.group(1) for key in os.environ if (match := db_name_pattern.match(key))}, key=int)
+    db_configs = []
+    for db_index in db_indices:
+        dbname = os.environ[f"DB{db_index}_NAME"]
+        zip_level_setting = os.getenv(f"DB{db_index}_ZIP_LEVEL", "1")  # Default to fastest compression if not set
+
+        # Skip entries with an empty database name
         if not dbname:
-            break
-
-        logger.info(f"Processing database: {dbname}")
-
-        # Check database connection
-        check_database_connection(dbname, dbuser, dbpass, dbhost)
-
-        # Generate backup filename
-        backup_file, backup_time = generate_backup_filename(dbname)
-
-        # Perform MySQL backup
-        status, message = perform_backup(dbname, dbuser, dbpass, dbhost, backup_file)
-
-        # Write final status to the log for each database
-        write_final_status(status, message, backup_file)
-
-        # Clean up old backups
-        logger.info(f"Checking for old backups to delete for database: {dbname}...")
-        clean_old_backups(dbname, max_backups)
-
-        # Increment the index to move to the next database
-        db_index += 1
+            continue
+
+        # Skip this database if its compression level is invalid
+        zip_level = parse_zip_level(zip_level_setting)
+        if zip_level is None:
+            error_msg = f"Invalid DB{db_index}_ZIP_LEVEL '{zip_level_setting}' for database '{dbname}' (must be 0-9). Skipping backup."
+            logger.error(error_msg)
+            write_final_status("failure", error_msg, dbname=dbname)
+            continue
+
+        # Backup files are named and rotated by database name, so two concurrent backups of the
+        # same name (e.g. on different hosts) would write to the same file and rotate each other
+        if any(db_config["name"] == dbname for db_config in db_configs):
+            error_msg = f"Database '{dbname}' (DB{db_index}_NAME) is configured more than once. Skipping duplicate."
+            logger.error(error_msg)
+            write_final_status("failure", error_msg, dbname=dbname)
+            continue
+
+        db_configs.append({
+            "name": dbname,
+            "user": os.getenv(f"DB{db_index}_USER"),
+            "pass": os.getenv(f"DB{db_index}_PASS"),
+            "host": os.getenv(f"DB{db_index}_HOST", "localhost"),  # Default to localhost if not set
+            "max_backups": int(os.getenv(f"DB{db_index}_MAX_BACKUPS", 3)),  # Default to 3 if not set
+            "zip_level": zip_level,
+            "mysqldump_args": shlex.split(os.getenv(f"DB{db_index}_MYSQLDUMP_ARGS", default_mysqldump_args)),
+            # Hardlink the previous backup instead of dumping if the database is unchanged
+            "skip_unchanged": os.getenv(f"DB{db_index}_SKIP_UNCHANGED", "false").lower() in ("1", "true", "yes"),
+        })
+
+    # Size the connection pools, then check database connections
+    size_connection_pools(db_configs)
+    connection_failures = check_database_connections(db_configs)
+    for db_config in db_configs:
+        db_config["connection_error"] = connection_failures.get(db_config["name"])
+
+    # Back up the databases concurrently; each backup mostly waits on mysqldump and disk I/O
+    with ThreadPoolExecutor(max_workers=backup_concurrency) as executor:
+        list(executor.map(backup_database, db_configs))
 
     logger.info("Script finished")
 